@@ -14,13 +14,42 @@ DATABASE_CONFIG = {
     "POSTGRES_PORT": "5432"
 }
 
+# Connection pool configuration
+DATABASE_POOL_CONFIG = {
+    "POOL_SIZE": 20,
+    "MAX_OVERFLOW": 10,
+    "POOL_PRE_PING": True,
+    "POOL_RECYCLE": 3600,
+    "PREPARED_STATEMENT_CACHE_SIZE": 100
+}
+
+# In-process cache configuration
+CACHE_CONFIG = {
+    "USER_TTL_SECONDS": 300,
+    # Rejected senders are remembered briefly so newly whitelisted users get in quickly
+    "UNKNOWN_USER_TTL_SECONDS": 30,
+    "MAX_USERS": 10000
+}
+
 # Ollama configuration
 OLLAMA_CONFIG = {
     "BASE_URL": "http://ollama:11434",
-    "MODEL": "llama2",
+    "MODEL": "llama2:7b-chat-q4_K_M",
     "TEMPERATURE": 0
 }
 
+# LLM batching configuration
+BATCH_CONFIG = {
+    "MAX_BATCH": 8,
+    "BATCH_WAIT_MS": 10
+}
+
+# Local category classifier configuration
+CLASSIFIER_CONFIG = {
+    "MODEL": "BAAI/bge-small-en-v1.5",
+    "MIN_SCORE": 0.65
+}
+
 # Service configuration
 SERVICE_CONFIG = {
     "BOT_SERVICE_PORT": 8000,
@@ -43,6 +72,13 @@ class ExpenseCategory(Enum):
     ENTERTAINMENT = "Entertainment"
     OTHER = "Other"
 
+# Outcome of saving an expense
+class SaveStatus(Enum):
+    """Enum for the result of an expense insert."""
+    SAVED = "saved"
+    NOT_WHITELISTED = "not_whitelisted"
+    DB_ERROR = "db_error"
+
 # Available categories list
 EXPENSE_CATEGORIES: List[str] = [category.value for category in ExpenseCategory]
 
@@ -61,11 +97,19 @@ MESSAGES = {
 QUERIES = {
     "CHECK_USER_WHITELIST": "SELECT id FROM users WHERE telegram_id = :telegram_id",
     "INSERT_EXPENSE": """
+        WITH u AS (SELECT id FROM users WHERE telegram_id = :telegram_id)
         INSERT INTO expenses (user_id, description, amount, category, added_at)
-        VALUES (:user_id, :description, :amount, :category, :added_at)
+        SELECT u.id, :description, CAST(:amount AS numeric), :category, CAST(:added_at AS timestamp) FROM u
+        RETURNING user_id
     """
 }
 
+# Indexes created at startup for databases initialized from an older schema
+INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_user_added_at ON expenses(user_id, added_at DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_user_category ON expenses(user_id, category)"
+]
+
 # LLM Prompt template
 EXPENSE_ANALYSIS_PROMPT = """You are an expense analysis expert. Your job is to determine if a message contains expense information and extract it.
 
@@ -96,26 +140,38 @@ Examples of NON-EXPENSES:
 
 Return only the JSON response with fields: is_expense, description, amount, category"""
 
+# Human turn used when several messages are analyzed in a single LLM call
+BATCH_ANALYSIS_PROMPT = """Analyze each of the following messages independently. Each message is a JSON string preceded by its [index].
+
+{messages}
+
+Return only a JSON array with one object per message, including its index: [{{"index": 1, "is_expense": ..., "description": ..., "amount": ..., "category": ...}}, ...]"""
+
 # Error messages
 ERROR_MESSAGES = {
     "DATABASE_URL_MISSING": "DATABASE_URL environment variable is required",
-    "USER_NOT_FOUND": "User {telegram_id} not found in database",
-    "DATABASE_WHITELIST_ERROR": "Database error checking whitelist: {error}",
-    "DATABASE_SAVE_ERROR": "Database error saving expense: {error}",
-    "LLM_ANALYSIS_ERROR": "Error analyzing message with LLM: {error}",
-    "INVALID_EXPENSE_RESPONSE": "Invalid expense data in response: {result}",
-    "FAILED_TO_SAVE": "Failed to save expense for user {telegram_id}",
-    "INVALID_EXPENSE_DATA": "Invalid expense data extracted: {analysis}"
+    "USER_NOT_FOUND": "User %s not found in database",
+    "DATABASE_WHITELIST_ERROR": "Database error checking whitelist: %s",
+    "DATABASE_SAVE_ERROR": "Database error saving expense: %s",
+    "DATABASE_INDEX_ERROR": "Database error creating indexes: %s",
+    "LLM_ANALYSIS_ERROR": "Error analyzing message with LLM: %s",
+    "CLASSIFIER_INIT_ERROR": "Local category classifier unavailable, using LLM only: %s",
+    "CLASSIFIER_ERROR": "Error classifying message locally: %s",
+    "LLM_WARMUP_ERROR": "LLM warm-up failed, model will load on first request: %s",
+    "LLM_BATCH_INCOMPLETE": "LLM batch response missing %s of %s results, retrying individually",
+    "INVALID_EXPENSE_RESPONSE": "Invalid expense data in response: %s",
+    "FAILED_TO_SAVE": "Failed to save expense for user %s",
+    "INVALID_EXPENSE_DATA": "Invalid expense data extracted: %s"
 }
 
 # Log messages
 LOG_MESSAGES = {
-    "PROCESSING_EXPENSE": "Processing expense request from user {telegram_id}",
-    "UNAUTHORIZED_ATTEMPT": "Unauthorized user attempt: {telegram_id}",
-    "NON_EXPENSE_MESSAGE": "Non-expense message from {telegram_id}: [MESSAGE_HIDDEN]",
-    "LLM_RESPONSE": "LLM Response: {content}",
+    "PROCESSING_EXPENSE": "Processing expense request from user %s",
+    "UNAUTHORIZED_ATTEMPT": "Unauthorized user attempt: %s",
+    "NON_EXPENSE_MESSAGE": "Non-expense message from %s: [MESSAGE_HIDDEN]",
+    "LLM_RESPONSE": "LLM response received",
     "PARSED_RESULT": "Parsed result: [RESULT_HIDDEN]",
     "MESSAGE_NON_EXPENSE": "Message identified as non-expense: [MESSAGE_HIDDEN]",
-    "EXPENSE_SAVED": "Expense saved: {description} - ${amount} - {category}",
-    "SERVICE_STARTING": "Starting Bot Service on {host}:{port}"
+    "EXPENSE_SAVED": "Expense saved: %s - $%s - %s",
+    "SERVICE_STARTING": "Starting Bot Service on %s:%s"
 } 
\ No newline at end of file
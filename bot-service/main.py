@@ -5,15 +5,16 @@ Bot Service - FastAPI application for expense analysis and database operations.
 
 import os
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
 from dotenv import load_dotenv
 
-from constants import SERVICE_CONFIG, MESSAGES
+from constants import SERVICE_CONFIG, MESSAGES, LOG_MESSAGES
 from service import ExpenseService
 
 # Load environment variables
@@ -33,7 +34,8 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 app = FastAPI(
     title="Bot Service",
     description="Expense analysis and database operations service",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -50,17 +52,31 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is required")
 
-# Initialize service
-expense_service = ExpenseService(DATABASE_URL)
+# Built on startup so LangChain and the classifier load off the import path
+expense_service: Optional[ExpenseService] = None
+
+@app.on_event("startup")
+async def startup_event():
+    """Create the service and prepare the database and the LLM on startup."""
+    global expense_service
+    expense_service = ExpenseService(DATABASE_URL)
+    
+    # Also opens the first pooled connection
+    await expense_service.repository.ensure_indexes()
+    await expense_service.warmup()
 
 # Pydantic models
 class ExpenseRequest(BaseModel):
     """Request model for processing an expense message."""
+    model_config = ConfigDict(defer_build=True)
+    
     telegram_id: str = Field(..., description="Telegram user ID")
     message: str = Field(..., description="User message to process")
 
 class ExpenseResponse(BaseModel):
     """Response model for expense processing."""
+    model_config = ConfigDict(defer_build=True)
+    
     success: bool
     category: str | None = None
     description: str | None = None
@@ -69,18 +85,24 @@ class ExpenseResponse(BaseModel):
 
 class HealthResponse(BaseModel):
     """Response model for health check endpoint."""
+    model_config = ConfigDict(defer_build=True)
+    
     status: str
     service: str
     timestamp: datetime
 
 class ExpenseStatsResponse(BaseModel):
     """Response model for expense statistics."""
+    model_config = ConfigDict(defer_build=True)
+    
     total_expenses: int
     total_amount: float
     categories: Dict[str, Dict[str, Any]]
 
 class UserExpensesResponse(BaseModel):
     """Response model for user expenses."""
+    model_config = ConfigDict(defer_build=True)
+    
     expenses: list
     count: int
 
@@ -130,7 +152,7 @@ async def get_categories() -> Dict[str, Any]:
     return {"categories": expense_service.get_categories()}
 
 @app.get("/expenses/{telegram_id}", response_model=UserExpensesResponse)
-async def get_user_expenses(telegram_id: str, limit: int = 10) -> UserExpensesResponse:
+async def get_user_expenses(telegram_id: str, limit: int = Query(10, ge=1, le=100)) -> UserExpensesResponse:
     """
     Get recent expenses for a user.
     
@@ -141,7 +163,7 @@ async def get_user_expenses(telegram_id: str, limit: int = 10) -> UserExpensesRe
     Returns:
         UserExpensesResponse: User's recent expenses.
     """
-    expenses = expense_service.get_user_expenses(telegram_id, limit)
+    expenses = await expense_service.get_user_expenses(telegram_id, limit)
     return UserExpensesResponse(
         expenses=expenses,
         count=len(expenses)
@@ -158,7 +180,7 @@ async def get_expense_stats(telegram_id: str) -> ExpenseStatsResponse:
     Returns:
         ExpenseStatsResponse: User's expense statistics.
     """
-    stats = expense_service.get_expense_stats(telegram_id)
+    stats = await expense_service.get_expense_stats(telegram_id)
     return ExpenseStatsResponse(
         total_expenses=stats["total_expenses"],
         total_amount=stats["total_amount"],
@@ -171,5 +193,5 @@ if __name__ == "__main__":
     port = int(os.getenv("BOT_SERVICE_PORT", SERVICE_CONFIG["BOT_SERVICE_PORT"]))
     host = os.getenv("BOT_SERVICE_HOST", SERVICE_CONFIG["BOT_SERVICE_HOST"])
     
-    logger.info(f"Starting Bot Service on {host}:{port}")
+    logger.info(LOG_MESSAGES["SERVICE_STARTING"], host, port)
     uvicorn.run(app, host=host, port=port) 
\ No newline at end of file
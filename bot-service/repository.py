@@ -2,18 +2,23 @@
 Repository pattern implementation for database operations.
 """
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
+import time
 import logging
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.exc import SQLAlchemyError
 
-from constants import QUERIES, ERROR_MESSAGES, LOG_MESSAGES
+from constants import DATABASE_POOL_CONFIG, CACHE_CONFIG, QUERIES, INDEXES, ERROR_MESSAGES, LOG_MESSAGES, SaveStatus
 
 logger = logging.getLogger(__name__)
 
+# Parsed once; asyncpg caches the prepared statements per connection
+STATEMENTS = {name: text(query) for name, query in QUERIES.items()}
+
 class ExpenseRepository:
     """Repository for expense-related database operations."""
     
@@ -24,10 +29,41 @@ class ExpenseRepository:
         Args:
             database_url (str): Database connection string.
         """
-        self.engine = create_engine(database_url)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        url = make_url(database_url).set(drivername="postgresql+asyncpg")
+        connect_args = {
+            "prepared_statement_cache_size": DATABASE_POOL_CONFIG["PREPARED_STATEMENT_CACHE_SIZE"]
+        }
+        # asyncpg rejects libpq's sslmode parameter but accepts the same modes as its ssl argument
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            connect_args["ssl"] = sslmode
+            url = url.difference_update_query(["sslmode"])
+        
+        self.engine = create_async_engine(
+            url,
+            pool_size=DATABASE_POOL_CONFIG["POOL_SIZE"],
+            max_overflow=DATABASE_POOL_CONFIG["MAX_OVERFLOW"],
+            pool_pre_ping=DATABASE_POOL_CONFIG["POOL_PRE_PING"],
+            pool_recycle=DATABASE_POOL_CONFIG["POOL_RECYCLE"],
+            connect_args=connect_args
+        )
+        # telegram_id -> (user_id or None if not whitelisted, cached_at), oldest first
+        self._user_cache: Dict[str, Tuple[Optional[int], float]] = {}
+    
+    async def ensure_indexes(self) -> None:
+        """
+        Create the indexes used by the expense queries if they do not exist yet.
+        """
+        try:
+            # CONCURRENTLY builds without blocking writes but cannot run inside a transaction
+            async with self.engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                for statement in INDEXES:
+                    await conn.execute(text(statement))
+        except SQLAlchemyError as e:
+            logger.error(ERROR_MESSAGES["DATABASE_INDEX_ERROR"], e)
     
-    def is_user_whitelisted(self, telegram_id: str) -> bool:
+    async def is_user_whitelisted(self, telegram_id: str) -> bool:
         """
         Check if a user is in the whitelist.
         
@@ -37,18 +73,9 @@ class ExpenseRepository:
         Returns:
             bool: True if user is whitelisted, False otherwise.
         """
-        try:
-            with self.engine.connect() as conn:
-                result = conn.execute(
-                    text(QUERIES["CHECK_USER_WHITELIST"]),
-                    {"telegram_id": telegram_id}
-                )
-                return result.fetchone() is not None
-        except SQLAlchemyError as e:
-            logger.error(ERROR_MESSAGES["DATABASE_WHITELIST_ERROR"].format(error=e))
-            return False
+        return await self.get_user_id(telegram_id) is not None
     
-    def get_user_id(self, telegram_id: str) -> Optional[int]:
+    async def get_user_id(self, telegram_id: str) -> Optional[int]:
         """
         Get user ID from telegram_id.
         
@@ -58,19 +85,41 @@ class ExpenseRepository:
         Returns:
             Optional[int]: User ID if found, None otherwise.
         """
+        cached = self._user_cache.get(telegram_id)
+        if cached:
+            ttl = CACHE_CONFIG["USER_TTL_SECONDS"] if cached[0] is not None else CACHE_CONFIG["UNKNOWN_USER_TTL_SECONDS"]
+            if time.monotonic() - cached[1] < ttl:
+                return cached[0]
+        
         try:
-            with self.engine.connect() as conn:
-                result = conn.execute(
-                    text(QUERIES["CHECK_USER_WHITELIST"]),
+            async with self.engine.connect() as conn:
+                result = await conn.execute(
+                    STATEMENTS["CHECK_USER_WHITELIST"],
                     {"telegram_id": telegram_id}
                 )
                 user = result.fetchone()
-                return user[0] if user else None
+                user_id = user[0] if user else None
+                self._cache_user(telegram_id, user_id)
+                return user_id
         except SQLAlchemyError as e:
-            logger.error(ERROR_MESSAGES["DATABASE_WHITELIST_ERROR"].format(error=e))
+            self._user_cache.pop(telegram_id, None)
+            logger.error(ERROR_MESSAGES["DATABASE_WHITELIST_ERROR"], e)
             return None
     
-    def save_expense(self, telegram_id: str, description: str, amount: float, category: str) -> bool:
+    def _cache_user(self, telegram_id: str, user_id: Optional[int]) -> None:
+        """
+        Store a whitelist lookup result, evicting the oldest entry when the cache is full.
+        
+        Args:
+            telegram_id (str): Telegram user ID.
+            user_id (Optional[int]): User ID, or None if the user is not whitelisted.
+        """
+        self._user_cache.pop(telegram_id, None)
+        self._user_cache[telegram_id] = (user_id, time.monotonic())
+        if len(self._user_cache) > CACHE_CONFIG["MAX_USERS"]:
+            del self._user_cache[next(iter(self._user_cache))]
+    
+    async def save_expense(self, telegram_id: str, description: str, amount: float, category: str) -> SaveStatus:
         """
         Save an expense to the database.
         
@@ -81,41 +130,35 @@ class ExpenseRepository:
             category (str): Expense category.
             
         Returns:
-            bool: True if saved successfully, False otherwise.
+            SaveStatus: SAVED on success, NOT_WHITELISTED if the user is unknown,
+                DB_ERROR if the insert failed.
         """
         try:
-            with self.engine.connect() as conn:
-                # Get user ID
-                user_id = self.get_user_id(telegram_id)
-                if not user_id:
-                    logger.error(ERROR_MESSAGES["USER_NOT_FOUND"].format(telegram_id=telegram_id))
-                    return False
-                
-                # Insert expense
-                conn.execute(
-                    text(QUERIES["INSERT_EXPENSE"]),
+            async with self.engine.begin() as conn:
+                # Resolve the user and insert in a single statement
+                result = await conn.execute(
+                    STATEMENTS["INSERT_EXPENSE"],
                     {
-                        "user_id": user_id,
+                        "telegram_id": telegram_id,
                         "description": description,
                         "amount": amount,
                         "category": category,
                         "added_at": datetime.utcnow()
                     }
                 )
-                conn.commit()
+                if result.fetchone() is None:
+                    self._user_cache.pop(telegram_id, None)
+                    logger.error(ERROR_MESSAGES["USER_NOT_FOUND"], telegram_id)
+                    return SaveStatus.NOT_WHITELISTED
                 
-                logger.info(LOG_MESSAGES["EXPENSE_SAVED"].format(
-                    description=description, 
-                    amount=amount, 
-                    category=category
-                ))
-                return True
+                logger.info(LOG_MESSAGES["EXPENSE_SAVED"], description, amount, category)
+                return SaveStatus.SAVED
                 
         except SQLAlchemyError as e:
-            logger.error(ERROR_MESSAGES["DATABASE_SAVE_ERROR"].format(error=e))
-            return False
+            logger.error(ERROR_MESSAGES["DATABASE_SAVE_ERROR"], e)
+            return SaveStatus.DB_ERROR
     
-    def get_user_expenses(self, telegram_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def get_user_expenses(self, telegram_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Get recent expenses for a user.
         
@@ -127,36 +170,32 @@ class ExpenseRepository:
             List[Dict[str, Any]]: List of expense dictionaries.
         """
         try:
-            with self.engine.connect() as conn:
+            async with self.engine.connect() as conn:
                 query = """
-                    SELECT e.description, e.amount, e.category, e.added_at
+                    SELECT
+                        e.description,
+                        e.amount::numeric::float8 AS amount,
+                        e.category,
+                        to_char(e.added_at, 'YYYY-MM-DD"T"HH24:MI:SS.US') AS added_at
                     FROM expenses e
                     JOIN users u ON e.user_id = u.id
                     WHERE u.telegram_id = :telegram_id
                     ORDER BY e.added_at DESC
                     LIMIT :limit
                 """
-                result = conn.execute(
+                result = await conn.execute(
                     text(query),
                     {"telegram_id": telegram_id, "limit": limit}
                 )
                 
-                expenses = []
-                for row in result.fetchall():
-                    expenses.append({
-                        "description": row[0],
-                        "amount": float(row[1]),
-                        "category": row[2],
-                        "added_at": row[3].isoformat() if row[3] else None
-                    })
-                
-                return expenses
+                # Values are already JSON-ready; rows only need wrapping in dicts
+                return [dict(row._mapping) for row in result]
                 
         except SQLAlchemyError as e:
-            logger.error(ERROR_MESSAGES["DATABASE_WHITELIST_ERROR"].format(error=e))
+            logger.error(ERROR_MESSAGES["DATABASE_WHITELIST_ERROR"], e)
             return []
     
-    def get_expense_stats(self, telegram_id: str) -> Dict[str, Any]:
+    async def get_expense_stats(self, telegram_id: str) -> Dict[str, Any]:
         """
         Get expense statistics for a user.
         
@@ -167,19 +206,20 @@ class ExpenseRepository:
             Dict[str, Any]: Statistics including total amount and category breakdown.
         """
         try:
-            with self.engine.connect() as conn:
+            async with self.engine.connect() as conn:
                 query = """
                     SELECT 
                         e.category,
                         COUNT(*) as count,
-                        SUM(e.amount::numeric) as total_amount
+                        SUM(e.amount::numeric) as total_amount,
+                        GROUPING(e.category) as is_total
                     FROM expenses e
                     JOIN users u ON e.user_id = u.id
                     WHERE u.telegram_id = :telegram_id
-                    GROUP BY e.category
-                    ORDER BY total_amount DESC
+                    GROUP BY ROLLUP(e.category)
+                    ORDER BY is_total, total_amount DESC
                 """
-                result = conn.execute(
+                result = await conn.execute(
                     text(query),
                     {"telegram_id": telegram_id}
                 )
@@ -195,8 +235,12 @@ class ExpenseRepository:
                     count = row[1]
                     total = float(row[2]) if row[2] else 0.0
                     
-                    stats["total_expenses"] += count
-                    stats["total_amount"] += total
+                    # The ROLLUP row carries the grand totals
+                    if row[3]:
+                        stats["total_expenses"] = count
+                        stats["total_amount"] = total
+                        continue
+                    
                     stats["categories"][category] = {
                         "count": count,
                         "total_amount": total
@@ -205,7 +249,7 @@ class ExpenseRepository:
                 return stats
                 
         except SQLAlchemyError as e:
-            logger.error(ERROR_MESSAGES["DATABASE_WHITELIST_ERROR"].format(error=e))
+            logger.error(ERROR_MESSAGES["DATABASE_WHITELIST_ERROR"], e)
             return {
                 "total_expenses": 0,
                 "total_amount": 0.0,
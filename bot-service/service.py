@@ -4,24 +4,149 @@ Service layer for expense processing business logic.
 
 import re
 import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set, Tuple, Callable, Awaitable
 
-from langchain_community.chat_models import ChatOllama
-from langchain.prompts import ChatPromptTemplate
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 from constants import (
     OLLAMA_CONFIG, 
+    BATCH_CONFIG,
+    CLASSIFIER_CONFIG,
     EXPENSE_ANALYSIS_PROMPT, 
+    BATCH_ANALYSIS_PROMPT,
     MESSAGES, 
     ERROR_MESSAGES, 
     LOG_MESSAGES,
-    EXPENSE_CATEGORIES
+    EXPENSE_CATEGORIES,
+    SaveStatus
 )
 from repository import ExpenseRepository
 
 logger = logging.getLogger(__name__)
 
+# Expenses always carry an amount; messages without a digit or currency symbol skip the LLM
+_MONEY_RE = re.compile(r'(?:\d|[$€£¥₹])')
+_JSON_BLOCK_RE = re.compile(r'\{[\s\S]*?\}')
+_JSON_OBJECT_RE = re.compile(r'\{[^{}]*\}')
+# Fast path only: any run of digits, and the plain amounts it accepts (no thousands separators)
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)*')
+_PLAIN_AMOUNT_RE = re.compile(r'\d+(?:\.\d{1,2})?')
+_CURRENCY_RE = re.compile(r'[$€£¥₹]|\b(?:bucks|dollars?|usd|euros?|eur)\b', re.IGNORECASE)
+_CURRENCY_BEFORE_RE = re.compile(r'(?:[$€£¥₹]|\b(?:usd|eur))\s*$', re.IGNORECASE)
+_CURRENCY_AFTER_RE = re.compile(r'\s*(?:[$€£¥₹]|(?:bucks|dollars?|usd|euros?|eur)\b)', re.IGNORECASE)
+
+def _amount_in_message(amount: float, message: str) -> bool:
+    """
+    Check that an extracted amount is written in the message it was attributed to.
+    
+    Args:
+        amount (float): Amount returned by the LLM.
+        message (str): The user's original message.
+        
+    Returns:
+        bool: True if some number in the message equals the amount.
+    """
+    for match in _NUMBER_RE.finditer(message):
+        token = match.group(0)
+        # Commas may be thousands separators ("1,200") or decimal commas ("4,50")
+        for candidate in {token.replace(",", ""), token.replace(",", ".")}:
+            try:
+                if abs(float(candidate) - amount) < 0.005:
+                    return True
+            except ValueError:
+                continue
+    return False
+
+class _BatchDispatcher:
+    """Micro-batches concurrent analysis requests into shared LLM calls."""
+    
+    def __init__(
+        self,
+        analyze_single: Callable[[str], Awaitable[Dict[str, Any]]],
+        analyze_batch: Callable[[List[str]], Awaitable[List[Dict[str, Any]]]],
+        max_batch: int,
+        wait_ms: int
+    ):
+        """
+        Initialize the dispatcher.
+        
+        Args:
+            analyze_single: Coroutine analyzing one message.
+            analyze_batch: Coroutine analyzing several messages in one LLM call.
+            max_batch (int): Maximum number of messages per LLM call.
+            wait_ms (int): Collection window in milliseconds after the first message arrives.
+        """
+        self._analyze_single = analyze_single
+        self._analyze_batch = analyze_batch
+        self._max_batch = max_batch
+        self._wait = wait_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+    
+    def start(self) -> None:
+        """Start the collecting worker on the running event loop if it is not running yet."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+    
+    async def submit(self, message: str) -> Dict[str, Any]:
+        """
+        Queue a message for analysis and wait for its result.
+        
+        Args:
+            message (str): The user's message to analyze.
+            
+        Returns:
+            Dict[str, Any]: Analysis result for this message.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, future))
+        return await future
+    
+    async def _run(self) -> None:
+        """Collect up to max_batch messages within the wait window and dispatch them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._wait
+            while len(batch) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Dispatch without blocking collection of the next batch
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """Analyze a collected batch and resolve each caller's future."""
+        messages = [message for message, _ in batch]
+        results: List[Dict[str, Any]] = []
+        try:
+            if len(messages) == 1:
+                results = [await self._analyze_single(messages[0])]
+            else:
+                results = await self._analyze_batch(messages)
+        except Exception as e:
+            logger.error(ERROR_MESSAGES["LLM_ANALYSIS_ERROR"], e)
+        finally:
+            # Never leave a caller waiting; messages without a result are treated as non-expenses
+            for index, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(results[index] if index < len(results) else {"is_expense": False})
+
 class ExpenseService:
     """Service for expense processing and analysis."""
     
@@ -32,14 +157,80 @@ class ExpenseService:
         Args:
             database_url (str): Database connection string.
         """
+        # LangChain is imported here rather than at module load to keep imports cheap
+        from langchain_community.chat_models import ChatOllama
+        from langchain.prompts import ChatPromptTemplate
+        
         self.repository = ExpenseRepository(database_url)
         self.llm = ChatOllama(
             model=OLLAMA_CONFIG["MODEL"],
             base_url=OLLAMA_CONFIG["BASE_URL"],
             temperature=OLLAMA_CONFIG["TEMPERATURE"]
         )
+        # Built once; the static system prompt stays identical across calls
+        self._prompt_template = ChatPromptTemplate.from_messages([
+            ("system", EXPENSE_ANALYSIS_PROMPT),
+            ("human", "{message}")
+        ])
+        self._batch_prompt_template = ChatPromptTemplate.from_messages([
+            ("system", EXPENSE_ANALYSIS_PROMPT),
+            ("human", BATCH_ANALYSIS_PROMPT)
+        ])
+        self._dispatcher = _BatchDispatcher(
+            self._analyze_single,
+            self._analyze_batch,
+            max_batch=BATCH_CONFIG["MAX_BATCH"],
+            wait_ms=BATCH_CONFIG["BATCH_WAIT_MS"]
+        )
+        
+        # Optional embedding classifier, loaded in the background by warmup();
+        # until it is ready every message uses the LLM
+        self._embedder = None
+        self._category_embeddings = None
+        self._classifier_task: Optional[asyncio.Task] = None
     
-    def is_user_authorized(self, telegram_id: str) -> bool:
+    def _load_classifier(self) -> None:
+        """
+        Load the embedding model and embed the categories once.
+        
+        Blocking (the model may be downloaded on first use), so warmup runs it in a background thread.
+        """
+        try:
+            import numpy as np
+            from fastembed import TextEmbedding
+        except ImportError:
+            return
+        
+        try:
+            embedder = TextEmbedding(model_name=CLASSIFIER_CONFIG["MODEL"])
+            self._category_embeddings = np.stack(list(embedder.embed(EXPENSE_CATEGORIES)))
+            self._embedder = embedder
+        except Exception as e:
+            logger.warning(ERROR_MESSAGES["CLASSIFIER_INIT_ERROR"], e)
+    
+    async def warmup(self) -> None:
+        """
+        Start the batch worker and classifier loading, and load the LLM before the first user request.
+        """
+        from langchain.schema import HumanMessage
+        
+        self._dispatcher.start()
+        
+        # Not awaited: serving starts while the classifier downloads and loads
+        if self._classifier_task is None:
+            self._classifier_task = asyncio.create_task(asyncio.to_thread(self._load_classifier))
+        
+        # The first streamed token means the model is loaded; closing the stream stops decoding
+        stream = self.llm.astream([HumanMessage(content="ok")])
+        try:
+            async for _ in stream:
+                break
+        except Exception as e:
+            logger.warning(ERROR_MESSAGES["LLM_WARMUP_ERROR"], e)
+        finally:
+            await stream.aclose()
+    
+    async def is_user_authorized(self, telegram_id: str) -> bool:
         """
         Check if a user is authorized to use the bot.
         
@@ -49,67 +240,250 @@ class ExpenseService:
         Returns:
             bool: True if user is authorized, False otherwise.
         """
-        return self.repository.is_user_whitelisted(telegram_id)
+        return await self.repository.is_user_whitelisted(telegram_id)
     
     async def analyze_expense_message(self, message: str) -> Dict[str, Any]:
         """
         Analyze a message to determine if it contains expense information.
         
+        Messages with a clear amount and category are handled by the local
+        classifier; the rest are batched into a single LLM request by the dispatcher.
+        
         Args:
             message (str): The user's message to analyze.
             
         Returns:
             Dict[str, Any]: Analysis result with keys is_expense, description, amount, category.
         """
-        # Create a structured prompt for expense analysis
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", EXPENSE_ANALYSIS_PROMPT),
-            ("human", "{message}")
-        ])
+        if not _MONEY_RE.search(message):
+            logger.info(LOG_MESSAGES["MESSAGE_NON_EXPENSE"])
+            return {"is_expense": False}
+        
+        analysis = await self._fast_analyze(message)
+        if analysis is not None:
+            return analysis
+        
+        return await self._dispatcher.submit(message)
+    
+    async def _fast_analyze(self, message: str) -> Optional[Dict[str, Any]]:
+        """
+        Extract the amount with a regex and pick the nearest category by embedding similarity.
+        
+        Only unambiguous messages are handled: exactly one plain number carrying an adjacent
+        currency marker ("Coffee $4.50"). Bare numbers, dates, times, ordinals, thousands
+        separators and multiple numbers are left to the LLM.
+        
+        Args:
+            message (str): The user's message to analyze.
+            
+        Returns:
+            Optional[Dict[str, Any]]: Analysis result, or None if the message is ambiguous
+                and should go to the LLM.
+        """
+        if self._embedder is None:
+            return None
+        
+        numbers = list(_NUMBER_RE.finditer(message))
+        if len(numbers) != 1 or not _PLAIN_AMOUNT_RE.fullmatch(numbers[0].group(0)):
+            return None
+        
+        match = numbers[0]
+        before, after = message[:match.start()], message[match.end():]
+        
+        # Letters glued to the number ("14th", "3pm", "A4") mean it is not an amount
+        if before[-1:].isalnum() or after[:1].isalpha():
+            return None
+        
+        # A bare number says nothing about spending ("Table for 2"); only money is fast-pathed
+        if not (_CURRENCY_BEFORE_RE.search(before) or _CURRENCY_AFTER_RE.match(after)):
+            return None
+        
+        amount = float(match.group(0))
+        description = " ".join(_CURRENCY_RE.sub(" ", before + " " + after).split())
+        if not description or amount <= 0:
+            return None
         
         try:
-            # Get response from LLM
-            messages = prompt_template.format_messages(message=message)
-            response = await self.llm.ainvoke(messages)
+            # Embedding runs in ONNX Runtime; keep it off the event loop
+            query = await asyncio.to_thread(lambda: next(iter(self._embedder.embed([description]))))
+            scores = self._category_embeddings @ query
+        except Exception as e:
+            logger.error(ERROR_MESSAGES["CLASSIFIER_ERROR"], e)
+            return None
+        
+        best = int(scores.argmax())
+        if scores[best] < CLASSIFIER_CONFIG["MIN_SCORE"]:
+            return None
+        
+        return {
+            "is_expense": True,
+            "description": description,
+            "amount": amount,
+            "category": EXPENSE_CATEGORIES[best]
+        }
+    
+    async def _analyze_single(self, message: str) -> Dict[str, Any]:
+        """
+        Analyze a single message with its own LLM call.
+        
+        Args:
+            message (str): The user's message to analyze.
             
-            # Parse the response
-            content = response.content
-            logger.info(LOG_MESSAGES["LLM_RESPONSE"].format(content="[LLM_RESPONSE_HIDDEN]"))
+        Returns:
+            Dict[str, Any]: Analysis result with keys is_expense, description, amount, category.
+        """
+        try:
+            # Get response from LLM
+            messages = self._prompt_template.format_messages(message=message)
+            content = await self._stream_json(messages, "{")
+            logger.info(LOG_MESSAGES["LLM_RESPONSE"])
             
             # Extract the first valid JSON block using regex
-            json_match = re.search(r'\{[\s\S]*?\}', content)
+            json_match = _JSON_BLOCK_RE.search(content)
             if json_match:
                 json_str = json_match.group(0)
             else:
                 json_str = content.strip()
             
-            result = json.loads(json_str)
-            logger.info(LOG_MESSAGES["PARSED_RESULT"].format(result=result))
+            result = _json_loads(json_str)
+            return self._validate_analysis(result)
             
-            # Validate the response
-            if not result.get("is_expense", False):
-                logger.info(LOG_MESSAGES["MESSAGE_NON_EXPENSE"].format(message=message))
-                return {"is_expense": False}
+        except Exception as e:
+            logger.error(ERROR_MESSAGES["LLM_ANALYSIS_ERROR"], e)
+            # Always return a valid result even if there is an error
+            return {"is_expense": False}
+    
+    async def _analyze_batch(self, messages: List[str]) -> List[Dict[str, Any]]:
+        """
+        Analyze several messages with a single LLM call.
+        
+        Messages the model leaves out of its response are analyzed individually.
+        
+        Args:
+            messages (List[str]): The users' messages to analyze.
             
-            # Additional validation for expense data
-            description = result.get("description")
-            amount = result.get("amount")
+        Returns:
+            List[Dict[str, Any]]: Analysis results in the same order as messages.
+        """
+        # JSON-encode each message so its text cannot break the line and pose as another entry
+        numbered = "\n".join(
+            f"[{index}] {json.dumps(message, ensure_ascii=False)}"
+            for index, message in enumerate(messages, 1)
+        )
+        
+        results: Dict[int, Dict[str, Any]] = {}
+        try:
+            prompt_messages = self._batch_prompt_template.format_messages(messages=numbered)
+            content = await self._stream_json(prompt_messages, "[")
+            logger.info(LOG_MESSAGES["LLM_RESPONSE"])
             
-            if not description or not amount or amount <= 0:
-                logger.warning(ERROR_MESSAGES["INVALID_EXPENSE_RESPONSE"].format(result=result))
-                return {"is_expense": False}
+            # Tolerate stray prose around the array by parsing each flat object on its own
+            for match in _JSON_OBJECT_RE.finditer(content):
+                try:
+                    item = _json_loads(match.group(0))
+                    index = item.get("index")
+                    if isinstance(index, int) and 1 <= index <= len(messages) and index not in results:
+                        analysis = self._validate_analysis(item)
+                        # Messages from several users share this prompt; an amount that is not in
+                        # the indexed message was steered or misattributed, so re-check it alone
+                        if analysis["is_expense"] and not _amount_in_message(analysis["amount"], messages[index - 1]):
+                            continue
+                        results[index] = analysis
+                except Exception:
+                    continue
+        except Exception as e:
+            logger.error(ERROR_MESSAGES["LLM_ANALYSIS_ERROR"], e)
+        
+        missing = [index for index in range(1, len(messages) + 1) if index not in results]
+        if missing:
+            logger.warning(ERROR_MESSAGES["LLM_BATCH_INCOMPLETE"], len(missing), len(messages))
+            retried = await asyncio.gather(*(self._analyze_single(messages[index - 1]) for index in missing))
+            results.update(zip(missing, retried))
+        
+        return [results[index] for index in range(1, len(messages) + 1)]
+    
+    async def _stream_json(self, messages: List[Any], opening: str) -> str:
+        """
+        Stream the LLM response and stop generation once the first JSON value is complete.
+        
+        Args:
+            messages (List[Any]): Formatted chat messages.
+            opening (str): Character that starts the expected value, "{" or "[".
             
-            return {
-                "is_expense": True,
-                "description": description,
-                "amount": float(amount),
-                "category": result.get("category", "Other")
-            }
+        Returns:
+            str: The first balanced JSON value, or the whole response if none completed.
+        """
+        content = ""
+        start = None
+        depth = 0
+        in_string = escaped = False
+        
+        stream = self.llm.astream(messages)
+        try:
+            async for chunk in stream:
+                offset = len(content)
+                content += chunk.content
+                for position in range(offset, len(content)):
+                    char = content[position]
+                    if start is None:
+                        if char == opening:
+                            start, depth = position, 1
+                    elif in_string:
+                        if escaped:
+                            escaped = False
+                        elif char == "\\":
+                            escaped = True
+                        elif char == '"':
+                            in_string = False
+                    elif char == '"':
+                        in_string = True
+                    elif char in "{[":
+                        depth += 1
+                    elif char in "}]":
+                        depth -= 1
+                        if depth == 0:
+                            value = content[start:position + 1]
+                            # Skip bracketed prose such as "[1]" that holds no object
+                            if "{" in value:
+                                return value
+                            start = None
+        finally:
+            # Closing the stream drops the connection, which stops Ollama decoding
+            await stream.aclose()
+        
+        return content
+    
+    def _validate_analysis(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate a parsed LLM result and normalize it to an analysis dictionary.
+        
+        Args:
+            result (Dict[str, Any]): JSON object returned by the LLM.
             
-        except Exception as e:
-            logger.error(ERROR_MESSAGES["LLM_ANALYSIS_ERROR"].format(error=e))
-            # Always return a valid result even if there is an error
+        Returns:
+            Dict[str, Any]: Analysis result with keys is_expense, description, amount, category.
+        """
+        logger.info(LOG_MESSAGES["PARSED_RESULT"])
+        
+        # Validate the response
+        if not result.get("is_expense", False):
+            logger.info(LOG_MESSAGES["MESSAGE_NON_EXPENSE"])
             return {"is_expense": False}
+        
+        # Additional validation for expense data
+        description = result.get("description")
+        amount = result.get("amount")
+        
+        if not description or not amount or amount <= 0:
+            logger.warning(ERROR_MESSAGES["INVALID_EXPENSE_RESPONSE"], result)
+            return {"is_expense": False}
+        
+        return {
+            "is_expense": True,
+            "description": description,
+            "amount": float(amount),
+            "category": result.get("category", "Other")
+        }
     
     async def process_expense(self, telegram_id: str, message: str) -> Dict[str, Any]:
         """
@@ -122,11 +496,11 @@ class ExpenseService:
         Returns:
             Dict[str, Any]: Processing result with success status and message.
         """
-        logger.info(LOG_MESSAGES["PROCESSING_EXPENSE"].format(telegram_id=telegram_id))
+        logger.info(LOG_MESSAGES["PROCESSING_EXPENSE"], telegram_id)
         
-        # Check if user is authorized
-        if not self.is_user_authorized(telegram_id):
-            logger.warning(LOG_MESSAGES["UNAUTHORIZED_ATTEMPT"].format(telegram_id=telegram_id))
+        # Check if user is authorized; cached, so unknown senders never reach the classifier or LLM
+        if not await self.is_user_authorized(telegram_id):
+            logger.warning(LOG_MESSAGES["UNAUTHORIZED_ATTEMPT"], telegram_id)
             return {
                 "success": False,
                 "message": MESSAGES["UNAUTHORIZED_USER"]
@@ -136,10 +510,7 @@ class ExpenseService:
         analysis = await self.analyze_expense_message(message)
         
         if not analysis.get("is_expense", False):
-            logger.info(LOG_MESSAGES["NON_EXPENSE_MESSAGE"].format(
-                telegram_id=telegram_id, 
-                message=message
-            ))
+            logger.info(LOG_MESSAGES["NON_EXPENSE_MESSAGE"], telegram_id)
             return {
                 "success": False,
                 "message": MESSAGES["NON_EXPENSE_MESSAGE"]
@@ -152,14 +523,15 @@ class ExpenseService:
         
         # Validate extracted data
         if not description or amount <= 0:
-            logger.error(ERROR_MESSAGES["INVALID_EXPENSE_DATA"].format(analysis=analysis))
+            logger.error(ERROR_MESSAGES["INVALID_EXPENSE_DATA"], analysis)
             return {
                 "success": False,
                 "message": MESSAGES["INVALID_EXPENSE_DATA"]
             }
         
-        # Save to database
-        if self.repository.save_expense(telegram_id, description, amount, category):
+        # Save to database; the insert re-checks the whitelist authoritatively
+        status = await self.repository.save_expense(telegram_id, description, amount, category)
+        if status is SaveStatus.SAVED:
             return {
                 "success": True,
                 "category": category,
@@ -167,14 +539,20 @@ class ExpenseService:
                 "amount": amount,
                 "message": MESSAGES["EXPENSE_ADDED"].format(category=category)
             }
+        elif status is SaveStatus.NOT_WHITELISTED:
+            logger.warning(LOG_MESSAGES["UNAUTHORIZED_ATTEMPT"], telegram_id)
+            return {
+                "success": False,
+                "message": MESSAGES["UNAUTHORIZED_USER"]
+            }
         else:
-            logger.error(ERROR_MESSAGES["FAILED_TO_SAVE"].format(telegram_id=telegram_id))
+            logger.error(ERROR_MESSAGES["FAILED_TO_SAVE"], telegram_id)
             return {
                 "success": False,
                 "message": MESSAGES["DATABASE_SAVE_ERROR"]
             }
     
-    def get_user_expenses(self, telegram_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def get_user_expenses(self, telegram_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Get recent expenses for a user.
         
@@ -185,9 +563,9 @@ class ExpenseService:
         Returns:
             List[Dict[str, Any]]: List of expense dictionaries.
         """
-        return self.repository.get_user_expenses(telegram_id, limit)
+        return await self.repository.get_user_expenses(telegram_id, limit)
     
-    def get_expense_stats(self, telegram_id: str) -> Dict[str, Any]:
+    async def get_expense_stats(self, telegram_id: str) -> Dict[str, Any]:
         """
         Get expense statistics for a user.
         
@@ -197,7 +575,7 @@ class ExpenseService:
         Returns:
             Dict[str, Any]: Statistics including total amount and category breakdown.
         """
-        return self.repository.get_expense_stats(telegram_id)
+        return await self.repository.get_expense_stats(telegram_id)
     
     def get_categories(self) -> List[str]:
         """
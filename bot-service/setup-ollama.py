@@ -6,37 +6,39 @@ This script downloads the specified model when the Ollama service starts
 
 import os
 import time
-import requests
+import httpx
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def wait_for_ollama(base_url: str, max_retries: int = 30) -> bool:
+def wait_for_ollama(client: httpx.Client, max_retries: int = 30, max_delay: float = 10.0) -> bool:
     """Wait for Ollama service to be ready"""
+    delay = 0.5
     for i in range(max_retries):
         try:
-            response = requests.get(f"{base_url}/api/tags", timeout=5)
+            response = client.get("/api/tags")
             if response.status_code == 200:
                 logger.info("Ollama service is ready")
                 return True
-        except requests.exceptions.RequestException:
+        except httpx.RequestError:
             pass
         
         logger.info(f"Waiting for Ollama service... ({i+1}/{max_retries})")
-        time.sleep(10)
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
     
     logger.error("Ollama service failed to start")
     return False
 
-def download_model(base_url: str, model_name: str) -> bool:
+def download_model(client: httpx.Client, model_name: str) -> bool:
     """Download the specified model"""
     try:
         logger.info(f"Downloading model: {model_name}")
         
         # Check if model already exists
-        response = requests.get(f"{base_url}/api/tags")
+        response = client.get("/api/tags")
         if response.status_code == 200:
             models = response.json().get("models", [])
             if any(model["name"] == model_name for model in models):
@@ -44,9 +46,11 @@ def download_model(base_url: str, model_name: str) -> bool:
                 return True
         
         # Download the model
-        response = requests.post(
-            f"{base_url}/api/pull",
-            json={"name": model_name}
+        # Pulling can take minutes, so this request has no timeout
+        response = client.post(
+            "/api/pull",
+            json={"name": model_name},
+            timeout=None
         )
         
         if response.status_code == 200:
@@ -60,20 +64,49 @@ def download_model(base_url: str, model_name: str) -> bool:
         logger.error(f"Error downloading model: {e}")
         return False
 
+def warm_up_model(client: httpx.Client, model_name: str, keep_alive: str) -> bool:
+    """Load the model into memory so the first real request does not pay load cost"""
+    try:
+        logger.info(f"Warming up model: {model_name}")
+        
+        # An empty prompt only loads the model; keep_alive keeps it resident
+        response = client.post(
+            "/api/generate",
+            json={"model": model_name, "prompt": "", "keep_alive": keep_alive},
+            timeout=None
+        )
+        
+        if response.status_code == 200:
+            logger.info(f"Model {model_name} loaded (keep_alive={keep_alive})")
+            return True
+        else:
+            logger.error(f"Failed to warm up model: {response.text}")
+            return False
+            
+    except Exception as e:
+        logger.error(f"Error warming up model: {e}")
+        return False
+
 def main():
     """Main function"""
     base_url = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
-    model_name = os.getenv("OLLAMA_MODEL", "llama2")
+    model_name = os.getenv("OLLAMA_MODEL", "llama2:7b-chat-q4_K_M")
+    keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "24h")
     
     logger.info(f"Setting up Ollama with model: {model_name}")
     
-    # Wait for Ollama service
-    if not wait_for_ollama(base_url):
-        return False
-    
-    # Download model
-    if not download_model(base_url, model_name):
-        return False
+    # One client for all calls so the connection is reused
+    with httpx.Client(base_url=base_url, timeout=5) as client:
+        # Wait for Ollama service
+        if not wait_for_ollama(client):
+            return False
+        
+        # Download model
+        if not download_model(client, model_name):
+            return False
+        
+        # Warm-up failures are not fatal; the model loads on first use instead
+        warm_up_model(client, model_name, keep_alive)
     
     logger.info("Ollama setup completed successfully")
     return True
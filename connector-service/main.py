@@ -5,15 +5,22 @@ Handles Telegram webhook, message forwarding, and response delivery.
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Optional
-from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from collections import OrderedDict
+from datetime import datetime, timezone
+from dataclasses import dataclass
 
 import httpx
+import orjson
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from telegram import Update, Bot
+from fastapi.responses import ORJSONResponse
+from telegram import Bot, Message
+from telegram.request import HTTPXRequest
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -27,99 +34,181 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Disable httpx logging to prevent token exposure
-logging.getLogger("httpx").setLevel(logging.WARNING)
-
-# Initialize FastAPI app
-app = FastAPI(
-    title="Connector Service",
-    description="Telegram API integration service",
-    version="1.0.0"
-)
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+logging.getLogger("httpx").setLevel(logging.ERROR)
 
 # Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 BOT_SERVICE_URL = os.getenv("BOT_SERVICE_URL", "http://bot-service:8000")
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "100"))
+PROCESSING_ACK_ENABLED = os.getenv("PROCESSING_ACK_ENABLED", "true").lower() == "true"
+PROCESSING_ACK_DELAY = float(os.getenv("PROCESSING_ACK_DELAY", "1.0"))
+PROCESSING_ACK_TEXT = "⏳"
+WEBHOOK_INFO_TTL = float(os.getenv("WEBHOOK_INFO_TTL", "300"))
+UPDATE_DEDUP_SIZE = 10_000
+UPDATE_DEDUP_TTL = 600
+# Must cover a slow LLM turn; the Bot Service keeps working (and saves) after the connector gives up
+BOT_SERVICE_DEADLINE = float(os.getenv("BOT_SERVICE_DEADLINE", "60"))
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "64"))
 
 if not TELEGRAM_BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
 
-# Initialize Telegram bot
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
+# Initialize Telegram bot with a connection pool sized for concurrent replies
+bot = Bot(
+    token=TELEGRAM_BOT_TOKEN,
+    request=HTTPXRequest(
+        connection_pool_size=TELEGRAM_POOL_SIZE,
+        connect_timeout=5.0,
+        read_timeout=30.0
+    )
+)
 
-# Pydantic models
-class HealthResponse(BaseModel):
-    status: str
-    service: str
-    timestamp: datetime
+# Updates are processed after the webhook is acknowledged; keep references so tasks are not collected
+background_tasks: Set[asyncio.Task] = set()
+update_slots = asyncio.Semaphore(MAX_CONCURRENT_UPDATES)
 
-class WebhookResponse(BaseModel):
-    status: str
+# Telegram metadata cache: key -> (fetched_at, value)
+telegram_info_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+telegram_info_lock = asyncio.Lock()
 
-class BotServiceRequest(BaseModel):
-    telegram_id: str
-    message: str
+# Recently seen update ids in arrival order: update_id -> seen_at
+seen_updates: "OrderedDict[int, float]" = OrderedDict()
 
-class BotServiceResponse(BaseModel):
+# Health payload rebuilt at most once per second: (built_at, payload)
+health_cache: Tuple[float, Dict[str, str]] = (float("-inf"), {})
+
+# Internal Bot Service reply; trusted, so it is not validated
+@dataclass
+class BotServiceResponse:
     success: bool
     message: str
     category: Optional[str] = None
     description: Optional[str] = None
     amount: Optional[float] = None
 
-async def forward_to_bot_service(telegram_id: str, message: str) -> BotServiceResponse:
+async def forward_to_bot_service(client: httpx.AsyncClient, telegram_id: str, message: str) -> BotServiceResponse:
     """Forward message to Bot Service for processing"""
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            request_data = BotServiceRequest(
-                telegram_id=telegram_id,
-                message=message
-            )
-            
-            logger.info(f"Forwarding message to Bot Service: {telegram_id} - [MESSAGE_HIDDEN]")
-            
-            logger.info(f"Making request to: {BOT_SERVICE_URL}/process-expense")
-            response = await client.post(
-                f"{BOT_SERVICE_URL}/process-expense",
-                json=request_data.model_dump(),
+    try:
+        logger.info("Forwarding message to Bot Service: %s - [MESSAGE_HIDDEN]", telegram_id)
+        
+        logger.info("Making request to: %s/process-expense", BOT_SERVICE_URL)
+        # Hard deadline for the whole exchange so a stuck Bot Service cannot hold the user
+        response = await asyncio.wait_for(
+            client.post(
+                "/process-expense",
+                content=orjson.dumps({"telegram_id": telegram_id, "message": message}),
                 headers={"Content-Type": "application/json"}
-            )
-            logger.info(f"Response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                logger.info(f"Bot Service response: [RESPONSE_HIDDEN]")
-                return BotServiceResponse(**result)
-            else:
-                logger.error(f"Bot Service error: {response.status_code} - {response.text}")
-                return BotServiceResponse(
-                    success=False,
-                    message="Error processing expense"
-                )
-                
-        except httpx.RequestError as e:
-            logger.error(f"HTTP request error: {e}")
-            logger.error(f"Request URL: {BOT_SERVICE_URL}/process-expense")
-            logger.error(f"Request data: [DATA_HIDDEN]")
+            ),
+            timeout=BOT_SERVICE_DEADLINE
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response status: %s", response.status_code)
+        
+        if response.status_code == 200:
+            result = orjson.loads(response.content)
+            logger.info("Bot Service response: [RESPONSE_HIDDEN]")
+            # Pick known keys only so new fields in the reply do not break parsing
             return BotServiceResponse(
-                success=False,
-                message="Service temporarily unavailable"
+                success=result["success"],
+                message=result["message"],
+                category=result.get("category"),
+                description=result.get("description"),
+                amount=result.get("amount")
             )
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+        else:
+            logger.error("Bot Service error: %s - %s", response.status_code, response.text)
             return BotServiceResponse(
                 success=False,
-                message="Internal server error"
+                message="Error processing expense"
             )
+            
+    except (asyncio.TimeoutError, httpx.ReadTimeout):
+        # The request reached the Bot Service, so asking for a resend could record it twice
+        logger.warning("Bot Service did not answer within %ss", BOT_SERVICE_DEADLINE)
+        return BotServiceResponse(
+            success=False,
+            message="Your message is taking longer than usual and is still being processed, no need to send it again"
+        )
+    except httpx.RequestError as e:
+        logger.error("HTTP request error: %s", e)
+        logger.error("Request URL: %s/process-expense", BOT_SERVICE_URL)
+        logger.error("Request data: [DATA_HIDDEN]")
+        return BotServiceResponse(
+            success=False,
+            message="Service temporarily unavailable"
+        )
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        return BotServiceResponse(
+            success=False,
+            message="Internal server error"
+        )
+
+async def get_cached_telegram_info(
+    key: str,
+    fetch: Callable[[], Awaitable[Dict[str, Any]]],
+    ttl: Optional[float] = None
+) -> Dict[str, Any]:
+    """Return cached Telegram metadata, fetching it when missing or older than ttl (None never expires)"""
+    
+    async with telegram_info_lock:
+        cached = telegram_info_cache.get(key)
+        now = time.monotonic()
+        if cached and (ttl is None or now - cached[0] < ttl):
+            return cached[1]
+        
+        value = await fetch()
+        telegram_info_cache[key] = (now, value)
+        return value
+
+async def fetch_bot_info() -> Dict[str, Any]:
+    """Fetch bot information from Telegram"""
+    
+    bot_info = await bot.get_me()
+    return {
+        "id": bot_info.id,
+        "username": bot_info.username,
+        "first_name": bot_info.first_name,
+        "can_join_groups": bot_info.can_join_groups,
+        "can_read_all_group_messages": bot_info.can_read_all_group_messages,
+        "supports_inline_queries": bot_info.supports_inline_queries
+    }
+
+async def fetch_webhook_info() -> Dict[str, Any]:
+    """Fetch webhook information from Telegram"""
+    
+    webhook_info = await bot.get_webhook_info()
+    return {
+        "url": webhook_info.url,
+        "has_custom_certificate": webhook_info.has_custom_certificate,
+        "pending_update_count": webhook_info.pending_update_count,
+        "last_error_date": webhook_info.last_error_date,
+        "last_error_message": webhook_info.last_error_message,
+        "max_connections": webhook_info.max_connections,
+        "allowed_updates": webhook_info.allowed_updates
+    }
+
+def is_duplicate_update(update_id: int) -> bool:
+    """Record an update id and report whether Telegram already delivered it recently"""
+    
+    now = time.monotonic()
+    
+    # Entries are in arrival order, so expired ones are always at the front
+    while seen_updates:
+        oldest_seen_at = next(iter(seen_updates.values()))
+        if now - oldest_seen_at < UPDATE_DEDUP_TTL:
+            break
+        seen_updates.popitem(last=False)
+    
+    if update_id in seen_updates:
+        return True
+    
+    # Cap the size too, so a burst cannot grow the window without bound
+    seen_updates[update_id] = now
+    if len(seen_updates) > UPDATE_DEDUP_SIZE:
+        seen_updates.popitem(last=False)
+    return False
 
 async def send_telegram_response(chat_id: int, message: str) -> bool:
     """Send response back to Telegram user"""
@@ -127,57 +216,174 @@ async def send_telegram_response(chat_id: int, message: str) -> bool:
     try:
         logger.info('Sending response to Telegram user')
         await bot.send_message(chat_id=chat_id, text=message)
-        logger.info(f"Response sent to {chat_id}: [MESSAGE_HIDDEN]")
+        logger.info("Response sent to %s: [MESSAGE_HIDDEN]", chat_id)
         return True
     except Exception as e:
-        logger.error(f"Failed to send Telegram response: {e}")
+        logger.error("Failed to send Telegram response: %s", e)
         return False
 
-async def handle_telegram_message(update: Update):
-    """Handle incoming Telegram messages"""
+async def send_processing_ack(chat_id: int) -> Optional[Message]:
+    """Send a placeholder message that is later edited with the result"""
     
-    if not update.message or not update.message.text:
-        return
+    try:
+        return await bot.send_message(chat_id=chat_id, text=PROCESSING_ACK_TEXT)
+    except Exception as e:
+        logger.error("Failed to send processing acknowledgement: %s", e)
+        return None
+
+async def edit_telegram_response(chat_id: int, message_id: int, message: str) -> bool:
+    """Replace the placeholder message with the final response"""
     
-    chat_id = update.message.chat_id
-    user_id = str(update.message.from_user.id) if update.message.from_user else "unknown"
-    message_text = update.message.text.strip()
+    try:
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=message)
+        logger.info("Response edited for %s: [MESSAGE_HIDDEN]", chat_id)
+        return True
+    except Exception as e:
+        logger.error("Failed to edit Telegram response: %s", e)
+        return False
+
+async def handle_telegram_message(chat_id: int, user_id: str, message_text: str, client: httpx.AsyncClient):
+    """Handle incoming Telegram messages"""
     
-    logger.info(f"Received message from {user_id} ({chat_id}): {message_text}")
+    logger.info("Received message from %s (%s): %s", user_id, chat_id, message_text)
     
     # Forward to Bot Service
-    bot_response = await forward_to_bot_service(user_id, message_text)
+    forward_task = asyncio.create_task(forward_to_bot_service(client, user_id, message_text))
+    
+    # Only slow turns get a placeholder; fast responses are sent directly
+    ack = None
+    if PROCESSING_ACK_ENABLED:
+        done, _ = await asyncio.wait({forward_task}, timeout=PROCESSING_ACK_DELAY)
+        if not done:
+            ack = await send_processing_ack(chat_id)
+    
+    bot_response = await forward_task
     
     # Send response back to user
     response_message = bot_response.message
+    if ack is not None and await edit_telegram_response(chat_id, ack.message_id, response_message):
+        return
     await send_telegram_response(chat_id, response_message)
 
-@app.get("/health", response_model=HealthResponse)
+async def process_update(chat_id: int, user_id: str, message_text: str, client: httpx.AsyncClient):
+    """Handle an acknowledged update in the background and free its slot"""
+    
+    try:
+        await handle_telegram_message(chat_id, user_id, message_text, client)
+    except Exception as e:
+        logger.error("Error processing update: %s", e)
+    finally:
+        update_slots.release()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared clients for this worker and release them on shutdown"""
+    logger.info("Connector Service starting up...")
+    
+    # Shared Bot Service client so connections are pooled across webhooks.
+    # HTTP/2 is negotiated via TLS ALPN, so it applies when BOT_SERVICE_URL is an
+    # https endpoint behind an h2-capable proxy; plain http falls back to HTTP/1.1
+    app.state.client = httpx.AsyncClient(
+        base_url=BOT_SERVICE_URL,
+        http2=True,
+        timeout=httpx.Timeout(connect=2.0, read=BOT_SERVICE_DEADLINE, write=5.0, pool=5.0),
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=30)
+    )
+    await bot.initialize()
+    
+    # Test bot connection
+    try:
+        bot_info = await get_cached_telegram_info("bot_info", fetch_bot_info)
+        logger.info("Bot connected: @%s", bot_info['username'])
+    except Exception as e:
+        logger.error("Failed to connect to Telegram bot: %s", e)
+        await app.state.client.aclose()
+        raise
+    
+    yield
+    
+    logger.info("Connector Service shutting down...")
+    
+    # Let in-flight updates finish before closing their clients
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    
+    await app.state.client.aclose()
+    await bot.shutdown()
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="Connector Service",
+    description="Telegram API integration service",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return HealthResponse(
-        status="healthy",
-        service="connector-service",
-        timestamp=datetime.utcnow()
-    )
+    global health_cache
+    
+    now = time.monotonic()
+    if now - health_cache[0] > 1.0:
+        health_cache = (now, {
+            "status": "healthy",
+            "service": "connector-service",
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+    return health_cache[1]
 
-@app.post("/webhook", response_model=WebhookResponse)
+@app.post("/webhook")
 async def telegram_webhook(request: Request):
     """Handle Telegram webhook updates"""
     
     try:
-        # Parse the update
-        update_data = await request.json()
-        update = Update.de_json(update_data, bot)
-        
-        # Handle the update
-        await handle_telegram_message(update)
-        
-        return WebhookResponse(status="ok")
+        # Read only the fields we need straight from the raw update
+        data = orjson.loads(await request.body())
+        update_id = data.get("update_id")
+        msg = data.get("message") or {}
+        chat_id = (msg.get("chat") or {}).get("id")
+        user_id = str((msg.get("from") or {}).get("id", "unknown"))
+        message_text = (msg.get("text") or "").strip()
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
+        logger.error("Error processing webhook: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
     
+    # Only text messages are handled
+    if chat_id is None or not message_text:
+        return {"status": "ok"}
+    
+    # Shed load when saturated; Telegram redelivers updates that were not acknowledged.
+    # Checked before the update is marked seen so the redelivery is not dropped as a duplicate,
+    # and with no await before acquire() so acquiring never blocks the response
+    if update_slots.locked():
+        logger.warning("Too many updates in flight, asking Telegram to retry")
+        raise HTTPException(status_code=503, detail="Service busy")
+    
+    # Telegram retries deliveries it considers failed; handle each update once
+    if update_id is not None and is_duplicate_update(update_id):
+        logger.info("Ignoring duplicate update %s", update_id)
+        return {"status": "ok"}
+    
+    # Acknowledge immediately and handle the update in the background
+    await update_slots.acquire()
+    task = asyncio.create_task(
+        process_update(chat_id, user_id, message_text, request.app.state.client)
+    )
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    
+    return {"status": "ok"}
 
 @app.post("/set-webhook")
 async def set_webhook(webhook_url: str):
@@ -186,14 +392,15 @@ async def set_webhook(webhook_url: str):
     try:
         success = await bot.set_webhook(url=webhook_url)
         if success:
-            logger.info(f"Webhook set successfully: {webhook_url}")
+            telegram_info_cache.pop("webhook_info", None)
+            logger.info("Webhook set successfully: %s", webhook_url)
             return {"status": "success", "message": "Webhook set successfully"}
         else:
             logger.error("Failed to set webhook")
             return {"status": "error", "message": "Failed to set webhook"}
             
     except Exception as e:
-        logger.error(f"Error setting webhook: {e}")
+        logger.error("Error setting webhook: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.get("/webhook-info")
@@ -201,18 +408,9 @@ async def get_webhook_info():
     """Get current webhook information"""
     
     try:
-        webhook_info = await bot.get_webhook_info()
-        return {
-            "url": webhook_info.url,
-            "has_custom_certificate": webhook_info.has_custom_certificate,
-            "pending_update_count": webhook_info.pending_update_count,
-            "last_error_date": webhook_info.last_error_date,
-            "last_error_message": webhook_info.last_error_message,
-            "max_connections": webhook_info.max_connections,
-            "allowed_updates": webhook_info.allowed_updates
-        }
+        return await get_cached_telegram_info("webhook_info", fetch_webhook_info, WEBHOOK_INFO_TTL)
     except Exception as e:
-        logger.error(f"Error getting webhook info: {e}")
+        logger.error("Error getting webhook info: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.delete("/delete-webhook")
@@ -222,6 +420,7 @@ async def delete_webhook():
     try:
         success = await bot.delete_webhook()
         if success:
+            telegram_info_cache.pop("webhook_info", None)
             logger.info("Webhook deleted successfully")
             return {"status": "success", "message": "Webhook deleted successfully"}
         else:
@@ -229,7 +428,7 @@ async def delete_webhook():
             return {"status": "error", "message": "Failed to delete webhook"}
             
     except Exception as e:
-        logger.error(f"Error deleting webhook: {e}")
+        logger.error("Error deleting webhook: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.get("/bot-info")
@@ -237,44 +436,29 @@ async def get_bot_info():
     """Get bot information"""
     
     try:
-        bot_info = await bot.get_me()
-        return {
-            "id": bot_info.id,
-            "username": bot_info.username,
-            "first_name": bot_info.first_name,
-            "can_join_groups": bot_info.can_join_groups,
-            "can_read_all_group_messages": bot_info.can_read_all_group_messages,
-            "supports_inline_queries": bot_info.supports_inline_queries
-        }
+        # Bot identity does not change while running; refreshed on restart
+        return await get_cached_telegram_info("bot_info", fetch_bot_info)
     except Exception as e:
-        logger.error(f"Error getting bot info: {e}")
+        logger.error("Error getting bot info: %s", e)
         return {"status": "error", "message": str(e)}
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on startup"""
-    logger.info("Connector Service starting up...")
-    
-    # Test bot connection
-    try:
-        bot_info = await bot.get_me()
-        logger.info(f"Bot connected: @{bot_info.username}")
-    except Exception as e:
-        logger.error(f"Failed to connect to Telegram bot: {e}")
-        raise
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Cleanup on shutdown"""
-    logger.info("Connector Service shutting down...")
-
 if __name__ == "__main__":
     import uvicorn
     
     port = int(os.getenv("CONNECTOR_SERVICE_PORT", 8001))
     host = os.getenv("CONNECTOR_SERVICE_HOST", "0.0.0.0")
     
-    logger.info(f"Starting Connector Service on {host}:{port}")
-    uvicorn.run(app, host=host, port=port) 
\ No newline at end of file
+    # Update dedup, the in-flight limit and the Telegram info cache live in each process,
+    # so extra workers weaken dedup and multiply MAX_CONCURRENT_UPDATES; one by default
+    workers = int(os.getenv("WORKERS", "1"))
+    limit_concurrency = os.getenv("LIMIT_CONCURRENCY")
+    
+    logger.info("Starting Connector Service on %s:%s", host, port)
+    # Import string is required for multiple workers; uvicorn picks uvloop/httptools when installed
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        limit_concurrency=int(limit_concurrency) if limit_concurrency else None
+    ) 
\ No newline at end of file
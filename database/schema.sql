@@ -19,8 +19,9 @@ CREATE TABLE expenses (
 );
 
 -- Index for faster lookups
-CREATE INDEX idx_users_telegram_id ON users(telegram_id);
-CREATE INDEX idx_expenses_user_id ON expenses(user_id);
+-- users.telegram_id is already indexed by its UNIQUE constraint
+CREATE INDEX idx_expenses_user_added_at ON expenses(user_id, added_at DESC);
+CREATE INDEX idx_expenses_user_category ON expenses(user_id, category);
 CREATE INDEX idx_expenses_category ON expenses(category);
 CREATE INDEX idx_expenses_added_at ON expenses(added_at);
 
@@ -6,7 +6,6 @@ Helps users get started quickly with the project.
 
 import os
 import sys
-import subprocess
 import shutil
 from pathlib import Path
 
@@ -33,15 +32,11 @@ def check_docker():
     """Check if Docker is available"""
     print("\n🐳 Checking Docker...")
     
-    try:
-        result = subprocess.run(['docker', '--version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ Docker is available")
-            return True
-        else:
-            print("❌ Docker is not available")
-            return False
-    except FileNotFoundError:
+    # A PATH lookup is enough to know Docker exists; no need to spawn it
+    if shutil.which("docker"):
+        print("✅ Docker is available")
+        return True
+    else:
         print("❌ Docker is not installed")
         return False
 
@@ -77,44 +72,77 @@ def setup_virtual_environments():
     """Set up virtual environments for both services"""
     print("\n🐍 Setting up virtual environments...")
     
+    # Only the install steps spawn processes; keep the import off the startup path
+    import subprocess
+    
     services = ["bot-service", "connector-service"]
     
+    # uv creates environments much faster than the venv module when available
+    uv_path = shutil.which("uv")
+    
+    # Services are independent: start every venv first, then wait for all of them
+    processes = []
     for service in services:
         venv_path = Path(service) / "venv"
         if not venv_path.exists():
             print(f"Creating virtual environment for {service}...")
-            try:
-                subprocess.run([sys.executable, "-m", "venv", str(venv_path)], check=True)
-                print(f"✅ Created virtual environment for {service}")
-            except subprocess.CalledProcessError as e:
-                print(f"❌ Failed to create virtual environment for {service}: {e}")
+            if uv_path:
+                command = [uv_path, "venv", "--python", sys.executable, str(venv_path)]
+            else:
+                command = [sys.executable, "-m", "venv", str(venv_path)]
+            processes.append((service, subprocess.Popen(command)))
         else:
             print(f"✅ Virtual environment for {service} already exists")
+    
+    for service, process in processes:
+        returncode = process.wait()
+        if returncode == 0:
+            print(f"✅ Created virtual environment for {service}")
+        else:
+            print(f"❌ Failed to create virtual environment for {service}: exit code {returncode}")
 
 def install_dependencies():
     """Install dependencies for both services"""
     print("\n📦 Installing dependencies...")
     
+    import subprocess
+    
     services = ["bot-service", "connector-service"]
     
+    # uv resolves and installs in parallel; fall back to pip when it is missing
+    uv_path = shutil.which("uv")
+    
+    # Install into both venvs concurrently; the wheel cache is shared between them
+    processes = []
     for service in services:
         print(f"\nInstalling dependencies for {service}...")
         requirements_path = Path(service) / "requirements.txt"
         
         if requirements_path.exists():
+            # Determine venv scripts path based on OS
+            if os.name == 'nt':  # Windows
+                scripts_path = Path(service) / "venv" / "Scripts"
+            else:  # Unix/Linux/macOS
+                scripts_path = Path(service) / "venv" / "bin"
+            
+            if uv_path:
+                command = [uv_path, "pip", "install", "--python", str(scripts_path / "python"), "-r", str(requirements_path)]
+            else:
+                command = [str(scripts_path / "pip"), "install", "--prefer-binary", "-r", str(requirements_path)]
+            
             try:
-                # Determine pip path based on OS
-                if os.name == 'nt':  # Windows
-                    pip_path = Path(service) / "venv" / "Scripts" / "pip"
-                else:  # Unix/Linux/macOS
-                    pip_path = Path(service) / "venv" / "bin" / "pip"
-                
-                subprocess.run([str(pip_path), "install", "-r", str(requirements_path)], check=True)
-                print(f"✅ Dependencies installed for {service}")
-            except subprocess.CalledProcessError as e:
+                processes.append((service, subprocess.Popen(command)))
+            except OSError as e:
                 print(f"❌ Failed to install dependencies for {service}: {e}")
         else:
             print(f"⚠️  requirements.txt not found in {service}")
+    
+    for service, process in processes:
+        returncode = process.wait()
+        if returncode == 0:
+            print(f"✅ Dependencies installed for {service}")
+        else:
+            print(f"❌ Failed to install dependencies for {service}: exit code {returncode}")
 
 def print_next_steps():
     """Print next steps for the user"""
@@ -11,6 +11,14 @@ import os
 from datetime import datetime
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
 # Load environment variables
 load_dotenv()
 
@@ -22,31 +30,54 @@ class BotTester:
     def __init__(self):
         self.bot_service_url = BOT_SERVICE_URL
         self.connector_service_url = CONNECTOR_SERVICE_URL
+        self.client = None
+    
+    async def __aenter__(self):
+        """Open one HTTP client shared by all tests"""
+        # Concurrent expense requests share the LLM, so allow more than the default 5s
+        self.client = httpx.AsyncClient(timeout=60.0)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        """Close the shared HTTP client"""
+        await self.client.aclose()
+    
+    @staticmethod
+    def _unwrap(result):
+        """Re-raise an exception captured by asyncio.gather"""
+        if isinstance(result, BaseException):
+            raise result
+        return result
         
     async def test_health_endpoints(self):
         """Test health endpoints of both services"""
         print("🔍 Testing health endpoints...")
         
-        async with httpx.AsyncClient() as client:
-            # Test Bot Service health
-            try:
-                response = await client.get(f"{self.bot_service_url}/health")
-                if response.status_code == 200:
-                    print("✅ Bot Service health check passed")
-                else:
-                    print(f"❌ Bot Service health check failed: {response.status_code}")
-            except Exception as e:
-                print(f"❌ Bot Service health check error: {e}")
-            
-            # Test Connector Service health
-            try:
-                response = await client.get(f"{self.connector_service_url}/health")
-                if response.status_code == 200:
-                    print("✅ Connector Service health check passed")
-                else:
-                    print(f"❌ Connector Service health check failed: {response.status_code}")
-            except Exception as e:
-                print(f"❌ Connector Service health check error: {e}")
+        bot_health, connector_health = await asyncio.gather(
+            self.client.get(f"{self.bot_service_url}/health"),
+            self.client.get(f"{self.connector_service_url}/health"),
+            return_exceptions=True
+        )
+        
+        # Test Bot Service health
+        try:
+            response = self._unwrap(bot_health)
+            if response.status_code == 200:
+                print("✅ Bot Service health check passed")
+            else:
+                print(f"❌ Bot Service health check failed: {response.status_code}")
+        except Exception as e:
+            print(f"❌ Bot Service health check error: {e}")
+        
+        # Test Connector Service health
+        try:
+            response = self._unwrap(connector_health)
+            if response.status_code == 200:
+                print("✅ Connector Service health check passed")
+            else:
+                print(f"❌ Connector Service health check failed: {response.status_code}")
+        except Exception as e:
+            print(f"❌ Connector Service health check error: {e}")
     
     async def test_expense_processing(self):
         """Test expense processing with various messages"""
@@ -80,92 +111,101 @@ class BotTester:
             }
         ]
         
-        async with httpx.AsyncClient() as client:
-            for i, test_case in enumerate(test_cases, 1):
-                print(f"\n📝 Test case {i}: {test_case['message']}")
+        # Requests are independent; send them together and report in order
+        responses = await asyncio.gather(*(
+            self.client.post(
+                f"{self.bot_service_url}/process-expense",
+                content=_json_dumps({
+                    "telegram_id": test_case["telegram_id"],
+                    "message": test_case["message"]
+                }),
+                headers={"Content-Type": "application/json"}
+            )
+            for test_case in test_cases
+        ), return_exceptions=True)
+        
+        for i, (test_case, result) in enumerate(zip(test_cases, responses), 1):
+            print(f"\n📝 Test case {i}: {test_case['message']}")
+            
+            try:
+                response = self._unwrap(result)
                 
-                try:
-                    response = await client.post(
-                        f"{self.bot_service_url}/process-expense",
-                        json={
-                            "telegram_id": test_case["telegram_id"],
-                            "message": test_case["message"]
-                        },
-                        headers={"Content-Type": "application/json"}
-                    )
+                if response.status_code == 200:
+                    result = _json_loads(response.content)
+                    print(f"   Status: {result.get('success')}")
+                    print(f"   Message: {result.get('message')}")
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        print(f"   Status: {result.get('success')}")
-                        print(f"   Message: {result.get('message')}")
+                    if result.get('success'):
+                        category = result.get('category')
+                        amount = result.get('amount')
+                        description = result.get('description')
+                        print(f"   Category: {category}")
+                        print(f"   Amount: ${amount}")
+                        print(f"   Description: {description}")
                         
-                        if result.get('success'):
-                            category = result.get('category')
-                            amount = result.get('amount')
-                            description = result.get('description')
-                            print(f"   Category: {category}")
-                            print(f"   Amount: ${amount}")
-                            print(f"   Description: {description}")
-                            
-                            if test_case["expected_category"]:
-                                if category == test_case["expected_category"]:
-                                    print("   ✅ Category matches expected")
-                                else:
-                                    print(f"   ⚠️  Category mismatch: expected {test_case['expected_category']}, got {category}")
-                        else:
-                            if test_case["expected_category"] is None:
-                                print("   ✅ Correctly rejected non-expense/unauthorized message")
+                        if test_case["expected_category"]:
+                            if category == test_case["expected_category"]:
+                                print("   ✅ Category matches expected")
                             else:
-                                print("   ❌ Unexpected failure")
+                                print(f"   ⚠️  Category mismatch: expected {test_case['expected_category']}, got {category}")
                     else:
-                        print(f"   ❌ HTTP Error: {response.status_code}")
-                        
-                except Exception as e:
-                    print(f"   ❌ Error: {e}")
+                        if test_case["expected_category"] is None:
+                            print("   ✅ Correctly rejected non-expense/unauthorized message")
+                        else:
+                            print("   ❌ Unexpected failure")
+                else:
+                    print(f"   ❌ HTTP Error: {response.status_code}")
+                    
+            except Exception as e:
+                print(f"   ❌ Error: {e}")
     
     async def test_categories_endpoint(self):
         """Test the categories endpoint"""
         print("\n📋 Testing categories endpoint...")
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(f"{self.bot_service_url}/categories")
-                if response.status_code == 200:
-                    categories = response.json().get("categories", [])
-                    print(f"✅ Available categories: {len(categories)}")
-                    for category in categories:
-                        print(f"   - {category}")
-                else:
-                    print(f"❌ Categories endpoint failed: {response.status_code}")
-            except Exception as e:
-                print(f"❌ Categories endpoint error: {e}")
+        try:
+            response = await self.client.get(f"{self.bot_service_url}/categories")
+            if response.status_code == 200:
+                categories = _json_loads(response.content).get("categories", [])
+                print(f"✅ Available categories: {len(categories)}")
+                for category in categories:
+                    print(f"   - {category}")
+            else:
+                print(f"❌ Categories endpoint failed: {response.status_code}")
+        except Exception as e:
+            print(f"❌ Categories endpoint error: {e}")
     
     async def test_connector_endpoints(self):
         """Test Connector Service endpoints"""
         print("\n🤖 Testing Connector Service endpoints...")
         
-        async with httpx.AsyncClient() as client:
-            # Test bot info
-            try:
-                response = await client.get(f"{self.connector_service_url}/bot-info")
-                if response.status_code == 200:
-                    bot_info = response.json()
-                    print(f"✅ Bot info retrieved: @{bot_info.get('username')}")
-                else:
-                    print(f"❌ Bot info failed: {response.status_code}")
-            except Exception as e:
-                print(f"❌ Bot info error: {e}")
-            
-            # Test webhook info
-            try:
-                response = await client.get(f"{self.connector_service_url}/webhook-info")
-                if response.status_code == 200:
-                    webhook_info = response.json()
-                    print(f"✅ Webhook info retrieved: {webhook_info.get('url', 'Not set')}")
-                else:
-                    print(f"❌ Webhook info failed: {response.status_code}")
-            except Exception as e:
-                print(f"❌ Webhook info error: {e}")
+        bot_info_result, webhook_info_result = await asyncio.gather(
+            self.client.get(f"{self.connector_service_url}/bot-info"),
+            self.client.get(f"{self.connector_service_url}/webhook-info"),
+            return_exceptions=True
+        )
+        
+        # Test bot info
+        try:
+            response = self._unwrap(bot_info_result)
+            if response.status_code == 200:
+                bot_info = _json_loads(response.content)
+                print(f"✅ Bot info retrieved: @{bot_info.get('username')}")
+            else:
+                print(f"❌ Bot info failed: {response.status_code}")
+        except Exception as e:
+            print(f"❌ Bot info error: {e}")
+        
+        # Test webhook info
+        try:
+            response = self._unwrap(webhook_info_result)
+            if response.status_code == 200:
+                webhook_info = _json_loads(response.content)
+                print(f"✅ Webhook info retrieved: {webhook_info.get('url', 'Not set')}")
+            else:
+                print(f"❌ Webhook info failed: {response.status_code}")
+        except Exception as e:
+            print(f"❌ Webhook info error: {e}")
     
     async def run_all_tests(self):
         """Run all tests"""
@@ -182,8 +222,13 @@ class BotTester:
 
 async def main():
     """Main test function"""
-    tester = BotTester()
-    await tester.run_all_tests()
+    async with BotTester() as tester:
+        await tester.run_all_tests()
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main()) 
\ No newline at end of file